@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+saida_calculo.py
+AUTOTRADER – SAÍDA POSICIONAL: cálculo em lote de GANHO REAL, ALVOS (1%, 2%, 3%)
+e SITUAÇÃO, usado pelos dois workers de saída.
+
+Separado de saida_common.py porque depende do NumPy (e opcionalmente do numba).
+"""
+
+import os
+
+import numpy as np
+
+
+# Multiplicadores dos alvos fixos (1%, 2%, 3%) sobre a entrada
+MULT_LONG = np.array([1.01, 1.02, 1.03])
+MULT_SHORT = np.array([0.99, 0.98, 0.97])
+
+# Código de situação (int8) -> texto do painel
+SITUACOES = np.array(["ABERTA", "ALVO 1", "ALVO 2", "ALVO 3"])
+
+
+def _lote_numpy(entradas: np.ndarray, precos: np.ndarray, lados: np.ndarray):
+    """Versão vetorizada em NumPy de _lote_kernel (padrão)."""
+    is_long = lados > 0
+    validos = (entradas > 0) & (precos > 0) & (lados != 0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ganhos = np.where(validos, lados * (precos - entradas) / entradas * 100.0, 0.0)
+
+    tem_alvo = (entradas > 0) & (lados != 0)
+    alvos = entradas[:, None] * np.where(is_long[:, None], MULT_LONG, MULT_SHORT)
+    alvos[~tem_alvo] = np.nan
+
+    # LONG bate o alvo subindo, SHORT caindo (comparações com NaN dão False).
+    # Multiplicar pelo lado (+1/-1) deixa as duas regras como um único ">=".
+    # Os alvos são crescentes na direção do ganho, então quem bateu o alvo 3
+    # bateu os três: o código da situação é a contagem de alvos atingidos.
+    atingiu = lados[:, None] * precos[:, None] >= lados[:, None] * alvos
+    atingiu &= validos[:, None]
+    codigos = atingiu.sum(axis=1, dtype=np.int8)
+    return ganhos, alvos, codigos
+
+
+def _lote_kernel(entradas: np.ndarray, precos: np.ndarray, lados: np.ndarray):
+    """Mesmo cálculo de _lote_numpy, em laço simples para compilar com numba."""
+    n = entradas.shape[0]
+    ganhos = np.zeros(n)
+    alvos = np.full((n, 3), np.nan)
+    codigos = np.zeros(n, dtype=np.int8)
+    for i in range(n):
+        entrada = entradas[i]
+        preco = precos[i]
+        lado = lados[i]
+        if entrada <= 0 or lado == 0:
+            continue
+        mult = MULT_LONG if lado > 0 else MULT_SHORT
+        for k in range(3):
+            alvos[i, k] = entrada * mult[k]
+        if preco <= 0:
+            continue
+        ganhos[i] = lado * (preco - entrada) / entrada * 100.0
+        for k in range(3):
+            codigos[i] += lado * preco >= lado * alvos[i, k]
+    return ganhos, alvos, codigos
+
+
+# Kernel compilado com numba: só com SAIDA_USAR_NUMBA=1. Num processo de um
+# ciclo com ~50 operações, importar o numba e carregar o cache custa centenas
+# de ms, contra ~0,1 ms de _lote_numpy.
+_lote_impl = None
+
+
+def _obter_lote_impl():
+    global _lote_impl
+    if _lote_impl is None:
+        _lote_impl = _lote_numpy
+        if os.environ.get("SAIDA_USAR_NUMBA") == "1":
+            try:
+                from numba import njit
+            except ImportError:  # numba é opcional: sem ele, segue em NumPy
+                pass
+            else:
+                _lote_impl = njit(cache=True)(_lote_kernel)
+    return _lote_impl
+
+
+def calcular_lote(entradas: np.ndarray, precos: np.ndarray, sides: np.ndarray):
+    """
+    Calcula GANHO REAL, ALVOS e SITUAÇÃO de todas as operações de uma vez.
+
+    Retorna (ganhos, alvos, situacoes):
+      - ganhos: % de ganho real (0 se entrada/preço inválidos ou side desconhecido)
+      - alvos: matriz N x 3 com alvo1..alvo3 (NaN quando não se aplica)
+      - situacoes: ABERTA / ALVO 1 / ALVO 2 / ALVO 3
+    Não trata stop nem gestão de risco – este painel é SOMENTE de saída.
+    Usa o kernel compilado com numba só se SAIDA_USAR_NUMBA=1.
+    """
+    lados = np.where(sides == "LONG", 1, np.where(sides == "SHORT", -1, 0)).astype(np.int8)
+    ganhos, alvos, codigos = _obter_lote_impl()(entradas, precos, lados)
+    return ganhos, alvos, SITUACOES[codigos]
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+saida_common.py
+AUTOTRADER – SAÍDA POSICIONAL: código comum dos workers
+
+Usado por:
+  worker_preco_saida.py              (gera precos_saida.cbor / .json)
+  worker/worker_saida_posicional.py  (operacoes + precos -> saida_posicional.json)
+  worker_saida_posicional.py         (versão antiga: preços do entrada.json)
+
+Contém:
+- log no console / arquivo
+- leitura de JSON e gravação atômica (orjson quando houver)
+
+Só stdlib + orjson/cbor2 (opcionais). O cálculo com NumPy fica em
+saida_calculo.py, para o worker de preços não pagar o import do numpy.
+"""
+
+import atexit
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional: sem ele, usa o json da stdlib
+    orjson = None
+
+try:
+    import cbor2
+except ImportError:  # cbor2 é opcional: sem ele, os preços seguem em JSON
+    cbor2 = None
+
+# Arquivo de log (definido por configurar_log) e handle aberto uma vez
+_LOG_PATH: Optional[Path] = None
+_LOG_FH = None
+
+
+# ---------------------------------------------------------------------------
+# Utilidades
+# ---------------------------------------------------------------------------
+
+def agora_iso() -> str:
+    return datetime.now(timezone.utc).astimezone().isoformat(timespec="seconds")
+
+
+def configurar_log(path: Path) -> None:
+    """Define o arquivo de log usado por log() (sem isso, só console)."""
+    global _LOG_PATH
+    _LOG_PATH = path
+
+
+def abrir_log():
+    """Abre o arquivo de log na primeira chamada e devolve o mesmo handle depois."""
+    global _LOG_FH
+    if _LOG_FH is None:
+        _LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+        _LOG_FH = _LOG_PATH.open("a", encoding="utf-8", buffering=1)
+        atexit.register(_LOG_FH.close)
+    return _LOG_FH
+
+
+def log(msg: str) -> None:
+    """Registra mensagem no console e no arquivo de log (se configurado)."""
+    linha = f"[{agora_iso()}] {msg}"
+    print(linha)
+    if _LOG_PATH is None:
+        return
+    try:
+        abrir_log().write(linha + "\n")
+    except Exception:
+        # Se der erro de log, não quebrar o worker
+        pass
+
+
+def json_loads(raw: bytes) -> Any:
+    """Decodifica JSON com orjson quando disponível."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def json_dumps(dados: Any, indentar: bool = False) -> bytes:
+    """
+    Serializa JSON (UTF-8) com orjson quando disponível.
+    Compacto por padrão: os arquivos gerados são lidos por programas (painel e
+    workers); indentar=True só para arquivos que alguém edita à mão.
+    """
+    if orjson is not None:
+        opcoes = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indentar else 0)
+        return orjson.dumps(dados, option=opcoes)
+    if indentar:
+        return json.dumps(dados, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(dados, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def carregar_json(path: Path, default: Any) -> Any:
+    """Carrega JSON ou devolve default se não existir / estiver inválido."""
+    return _carregar(path, default, json_loads)
+
+
+def _carregar(path: Path, default: Any, loads) -> Any:
+    try:
+        if not path.exists():
+            return default
+        with path.open("rb") as f:
+            return loads(f.read())
+    except Exception as e:
+        log(f"[ERRO] Falha ao ler {path}: {e}")
+        return default
+
+
+def _escrever_tudo(fd: int, data: bytes) -> None:
+    """os.write até o fim: uma escrita pode gravar só parte dos bytes."""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def escrever_atomico(caminho: Path, data: bytes) -> None:
+    """Grava em .tmp (um write + fsync) e troca pelo destino com os.replace."""
+    tmp = caminho.with_suffix(".tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        _escrever_tudo(fd, data)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(tmp, caminho)
+
+
+def escrever_direto(caminho: Path, data: bytes) -> None:
+    """
+    Grava direto no destino com O_DSYNC (sem .tmp + rename), poupando a troca
+    de metadados. Só para arquivos que ninguém lê durante a gravação: um
+    leitor concorrente pode pegar o arquivo pela metade.
+    """
+    o_dsync = getattr(os, "O_DSYNC", 0)
+    fd = os.open(caminho, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | o_dsync, 0o644)
+    try:
+        _escrever_tudo(fd, data)
+        if not o_dsync:
+            os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def salvar_json(path: Path, dados: Any, indentar: bool = False) -> bool:
+    """Salva JSON de forma segura (arquivo temporário + fsync + rename). True se gravou."""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        escrever_atomico(path, json_dumps(dados, indentar))
+        return True
+    except Exception as e:
+        log(f"[ERRO] Falha ao salvar {path}: {e}")
+        return False
+
+
+def caminho_precos(path_json: Path) -> Path:
+    """
+    Arquivo de preços a ler: o .cbor ao lado do .json quando há cbor2 e ele é
+    o mais recente (o .json pode ter sobrado de antes do cbor2 ser instalado).
+    """
+    if cbor2 is None:
+        return path_json
+    path_cbor = path_json.with_suffix(".cbor")
+    try:
+        mtime_cbor = path_cbor.stat().st_mtime_ns
+    except FileNotFoundError:
+        return path_json
+    try:
+        mtime_json = path_json.stat().st_mtime_ns
+    except FileNotFoundError:
+        return path_cbor
+    return path_cbor if mtime_cbor >= mtime_json else path_json
+
+
+def carregar_precos(path: Path, default: Any) -> Any:
+    """Carrega o arquivo de preços (CBOR ou JSON, pela extensão)."""
+    if path.suffix == ".cbor":
+        return _carregar(path, default, cbor2.loads)
+    return carregar_json(path, default)
+
+
+def salvar_precos(path_json: Path, dados: Any) -> Path:
+    """
+    Grava os preços para o worker de saída: em CBOR (mesmo nome, .cbor) quando
+    há cbor2, senão em JSON. Devolve o caminho gravado.
+    """
+    path_json.parent.mkdir(parents=True, exist_ok=True)
+    if cbor2 is None:
+        escrever_atomico(path_json, json_dumps(dados))
+        return path_json
+    path_cbor = path_json.with_suffix(".cbor")
+    escrever_atomico(path_cbor, cbor2.dumps(dados))
+    return path_cbor
+
+
+def impressao_entradas(*entradas: Any) -> str:
+    """
+    Impressão digital (sha256) das entradas já carregadas. Quem chama passa só
+    o que afeta a saída (ex.: precos["precos"] sem ultima_atualizacao).
+    """
+    return hashlib.sha256(repr(entradas).encode("utf-8")).hexdigest()
+
+
+def _caminho_impressao(destino: Path) -> Path:
+    return destino.with_name(destino.name + ".impressao")
+
+
+def precisa_atualizar(destino: Path, impressao: str) -> bool:
+    """
+    True se o destino não existe ou se foi gerado de entradas diferentes
+    (impressão gravada por registrar_impressao ao lado do destino). Não usa
+    mtime: cp -p / rsync -a / tar x trazem arquivos novos com mtime antigo.
+    """
+    if not destino.exists():
+        return True
+    try:
+        return _caminho_impressao(destino).read_text(encoding="ascii") != impressao
+    except (OSError, ValueError):
+        return True
+
+
+def registrar_impressao(destino: Path, impressao: str) -> None:
+    """Grava a impressão das entradas usadas na última gravação do destino."""
+    try:
+        escrever_atomico(_caminho_impressao(destino), impressao.encode("ascii"))
+    except Exception as e:
+        log(f"[ERRO] Falha ao salvar impressão de {destino}: {e}")
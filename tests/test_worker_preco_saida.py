@@ -0,0 +1,118 @@
+"""
+worker_preco_saida.py com exchanges falsas (sem rede): falha do
+fetch_tickers em lote, busca moeda a moeda e média BINANCE/BYBIT.
+"""
+
+import asyncio
+import json
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+
+class ExchangeFalsa:
+    """Imita o cliente assíncrono do ccxt: markets, load_markets, fetch_ticker(s)."""
+
+    def __init__(self, id, precos, recusados=()):
+        self.id = id
+        self.precos = precos            # {"BTC/USDT": 100.0, ...}
+        self.recusados = set(recusados)  # símbolos que a exchange recusa
+        self.markets = {}
+        self.cargas = 0
+
+    def set_markets(self, mercados):
+        self.markets = dict(mercados)
+
+    async def load_markets(self, reload=False):
+        self.cargas += 1
+        self.markets = {s: {"symbol": s, "active": True} for s in self.precos}
+        return self.markets
+
+    async def fetch_ticker(self, symbol):
+        if symbol in self.recusados:
+            raise ValueError(f"{self.id} does not have market symbol {symbol}")
+        return {"symbol": symbol, "last": self.precos[symbol]}
+
+    async def fetch_tickers(self, symbols):
+        recusados = self.recusados.intersection(symbols)
+        if recusados:
+            raise ValueError(f"{self.id} does not have market symbol {min(recusados)}")
+        return {s: await self.fetch_ticker(s) for s in symbols}
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def worker(tmp_path, monkeypatch):
+    ccxt = types.ModuleType("ccxt")
+    ccxt.async_support = types.ModuleType("ccxt.async_support")
+    monkeypatch.setitem(sys.modules, "ccxt", ccxt)
+    monkeypatch.setitem(sys.modules, "ccxt.async_support", ccxt.async_support)
+    monkeypatch.syspath_prepend(str(RAIZ))
+    monkeypatch.delitem(sys.modules, "worker_preco_saida", raising=False)
+    import worker_preco_saida as modulo
+
+    import saida_common
+    monkeypatch.setattr(saida_common, "cbor2", None)  # saída em JSON, fácil de ler
+    monkeypatch.setattr(modulo, "OUT_PATH", tmp_path / "precos_saida.json")
+    monkeypatch.setattr(modulo, "MOEDAS", ("BTC", "ETH", "ADA"))
+    return modulo
+
+
+def _rodar(worker, monkeypatch, binance, bybit):
+    monkeypatch.setattr(worker, "criar_exchanges", lambda: (binance, bybit))
+    asyncio.run(worker.atualizar_precos())
+    return json.loads(worker.OUT_PATH.read_text())["precos"]
+
+
+def test_media_das_exchanges_e_moeda_em_uma_so(worker, monkeypatch):
+    binance = ExchangeFalsa("binance", {"BTC/USDT": 100.0, "ETH/USDT": 10.0})
+    bybit = ExchangeFalsa("bybit", {"BTC/USDT": 102.0, "ADA/USDT": 0.5})
+
+    precos = _rodar(worker, monkeypatch, binance, bybit)
+
+    assert precos == {"BTC": 101.0, "ETH": 10.0, "ADA": 0.5}
+
+
+def test_lote_recusado_busca_moeda_a_moeda(worker, monkeypatch):
+    binance = ExchangeFalsa(
+        "binance", {"BTC/USDT": 100.0, "ETH/USDT": 10.0, "ADA/USDT": 0.4},
+        recusados={"ETH/USDT"},
+    )
+    bybit = ExchangeFalsa("bybit", {"BTC/USDT": 102.0, "ADA/USDT": 0.6})
+
+    precos = _rodar(worker, monkeypatch, binance, bybit)
+
+    # ETH recusada na BINANCE e ausente na BYBIT; as outras moedas continuam
+    assert precos == {"BTC": 101.0, "ADA": 0.5}
+
+
+def test_cache_de_mercados_recarrega_uma_vez_so(worker, monkeypatch):
+    def exchanges():
+        binance = ExchangeFalsa(
+            "binance", {"BTC/USDT": 100.0, "ETH/USDT": 10.0}, recusados={"ETH/USDT"}
+        )
+        return binance, ExchangeFalsa("bybit", {"BTC/USDT": 102.0})
+
+    binance, bybit = exchanges()
+    assert _rodar(worker, monkeypatch, binance, bybit) == {"BTC": 101.0}
+    assert binance.cargas == 1  # sem cache: load_markets
+
+    binance, bybit = exchanges()
+    assert _rodar(worker, monkeypatch, binance, bybit) == {"BTC": 101.0}
+    assert binance.cargas == 1  # cache válido: recarrega uma vez após a falha
+    assert bybit.cargas == 0
+
+    binance, bybit = exchanges()
+    assert _rodar(worker, monkeypatch, binance, bybit) == {"BTC": 101.0}
+    assert binance.cargas == 0  # cache já recarregado: direto moeda a moeda
+
+    monkeypatch.setattr(worker, "MOEDAS", ("BTC", "ETH"))
+    binance, bybit = exchanges()
+    _rodar(worker, monkeypatch, binance, bybit)
+    assert (binance.cargas, bybit.cargas) == (1, 1)  # MOEDAS mudou: cache refeito
@@ -0,0 +1,246 @@
+"""
+Equivalência do worker/worker_saida_posicional.py com o cálculo original
+(laço por operação com round() do Python), em operações aleatórias.
+"""
+
+import importlib.util
+import json
+import os
+import random
+from pathlib import Path
+
+import pytest
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+
+def _carregar_worker():
+    spec = importlib.util.spec_from_file_location(
+        "worker_saida_posicional_painel", RAIZ / "worker" / "worker_saida_posicional.py"
+    )
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+# ---------------------------------------------------------------------------
+# Cálculo de referência (versão original, uma operação por vez)
+# ---------------------------------------------------------------------------
+
+def _ganho_ref(entrada, preco, side):
+    if entrada <= 0 or preco <= 0:
+        return 0.0
+    if side == "LONG":
+        return ((preco - entrada) / entrada) * 100.0
+    if side == "SHORT":
+        return ((entrada - preco) / entrada) * 100.0
+    return 0.0
+
+
+def _alvos_ref(entrada, side):
+    if entrada <= 0:
+        return None, None, None, None, None, None
+    if side == "LONG":
+        alvos = (entrada * 1.01, entrada * 1.02, entrada * 1.03)
+    elif side == "SHORT":
+        alvos = (entrada * 0.99, entrada * 0.98, entrada * 0.97)
+    else:
+        alvos = (None, None, None)
+    return alvos[0], 1.0, alvos[1], 2.0, alvos[2], 3.0
+
+
+def _situacao_ref(side, preco, entrada, alvo1, alvo2, alvo3):
+    if entrada <= 0 or preco <= 0 or alvo1 is None:
+        return "ABERTA"
+    if side == "LONG":
+        atingiu = [preco >= a for a in (alvo3, alvo2, alvo1)]
+    elif side == "SHORT":
+        atingiu = [preco <= a for a in (alvo3, alvo2, alvo1)]
+    else:
+        return "ABERTA"
+    for nome, ok in zip(("ALVO 3", "ALVO 2", "ALVO 1"), atingiu):
+        if ok:
+            return nome
+    return "ABERTA"
+
+
+def _saida_ref(op, precos):
+    par = (op.get("par") or "").upper().strip()
+    side = (op.get("side") or "").upper().strip()
+    entrada = float(op.get("entrada") or 0)
+
+    preco_atual = None
+    if par and par in precos:
+        try:
+            preco_atual = float(precos[par])
+        except Exception:
+            preco_atual = None
+    preco_json = op.get("preco")
+    if preco_atual is None:
+        try:
+            preco = float(preco_json) if preco_json is not None else float(entrada)
+        except Exception:
+            preco = float(entrada)
+    else:
+        preco = preco_atual
+
+    ganho = _ganho_ref(entrada, preco, side)
+    alvo1, ganho1, alvo2, ganho2, alvo3, ganho3 = _alvos_ref(entrada, side)
+    return {
+        "id": op.get("id"),
+        "par": par,
+        "side": side,
+        "modo": op.get("modo") or "POSICIONAL",
+        "entrada": round(entrada, 3),
+        "preco": round(preco, 3),
+        "ganho": round(ganho, 2),
+        "alvo1": round(alvo1, 3) if alvo1 is not None else None,
+        "ganho1": ganho1,
+        "alvo2": round(alvo2, 3) if alvo2 is not None else None,
+        "ganho2": ganho2,
+        "alvo3": round(alvo3, 3) if alvo3 is not None else None,
+        "ganho3": ganho3,
+        "situacao": _situacao_ref(side, preco, entrada, alvo1, alvo2, alvo3),
+        "alav": op.get("alav"),
+        "data": op.get("data"),
+        "hora": op.get("hora"),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Testes
+# ---------------------------------------------------------------------------
+
+def _operacoes_aleatorias(n, seed=7):
+    rnd = random.Random(seed)
+    pares = ["BTC", "ETH", "ADA", "SOL", "XYZ", "", None]
+    ops = []
+    for i in range(n):
+        entrada = rnd.choice(
+            [0, -1, None, "3", 100.0, round(rnd.uniform(0.0001, 1000), rnd.randint(2, 6))]
+        )
+        op = {
+            "id": i + 1,
+            "par": rnd.choice(pares),
+            "side": rnd.choice(["LONG", "SHORT", "long", " short ", "x", None]),
+            "entrada": entrada,
+        }
+        if rnd.random() < 0.5:
+            op["preco"] = rnd.choice(
+                [None, 5, "ruim", round(rnd.uniform(0, 1000), rnd.randint(3, 6))]
+            )
+        ops.append(op)
+    return ops
+
+
+def _precos_aleatorios(seed=7):
+    rnd = random.Random(seed)
+    return {
+        "BTC": round(rnd.uniform(0.001, 1000), 4),
+        "ETH": 100.0 * 1.03,
+        "ADA": 272.0885,
+        "SOL": "x",
+    }
+
+
+@pytest.fixture
+def worker(tmp_path, monkeypatch):
+    modulo = _carregar_worker()
+    monkeypatch.setattr(modulo, "OPERACOES_PATH", tmp_path / "operacoes_posicional.json")
+    monkeypatch.setattr(modulo, "PRECOS_PATH", tmp_path / "precos_saida.json")
+    monkeypatch.setattr(modulo, "SAIDA_PATH", tmp_path / "saida_posicional.json")
+    return modulo
+
+
+def _rodar(worker, ops, precos):
+    worker.OPERACOES_PATH.write_text(json.dumps({"posicional": ops}))
+    worker.PRECOS_PATH.write_text(json.dumps({"precos": precos}))
+    worker.atualizar_saida_uma_vez()
+    return json.loads(worker.SAIDA_PATH.read_text())["posicional"]
+
+
+def test_saida_igual_ao_calculo_original(worker):
+    ops = _operacoes_aleatorias(20000)
+    precos = _precos_aleatorios()
+
+    saida = _rodar(worker, ops, precos)
+
+    assert saida == [_saida_ref(op, precos) for op in ops]
+
+
+def test_arredondamento_igual_ao_round_do_python(worker):
+    # Casos em que np.round e round() divergem
+    ops = [
+        {"id": 1, "par": "AAA", "side": "LONG", "entrada": 272.0885},
+        {"id": 2, "par": "BBB", "side": "SHORT", "entrada": 190.0075},
+    ]
+    precos = {"AAA": 272.0885, "BBB": 190.0075}
+
+    saida = _rodar(worker, ops, precos)
+
+    assert [s["entrada"] for s in saida] == [272.089, 190.007]
+    assert [s["preco"] for s in saida] == [272.089, 190.007]
+    assert saida == [_saida_ref(op, precos) for op in ops]
+
+
+def test_pula_so_quando_as_entradas_sao_iguais(worker):
+    ops = [{"id": 1, "par": "BTC", "side": "LONG", "entrada": 100.0}]
+    _rodar(worker, ops, {"BTC": 101.0})
+    worker.SAIDA_PATH.write_text("marcador")
+
+    # Preços regravados só com outro ultima_atualizacao: saída mantida
+    worker.PRECOS_PATH.write_text(
+        json.dumps({"precos": {"BTC": 101.0}, "ultima_atualizacao": "outra"})
+    )
+    worker.atualizar_saida_uma_vez()
+    assert worker.SAIDA_PATH.read_text() == "marcador"
+
+    # Operações trocadas por um arquivo com mtime antigo (cp -p, rsync -a)
+    worker.OPERACOES_PATH.write_text(
+        json.dumps({"posicional": [dict(ops[0], entrada=200.0)]})
+    )
+    os.utime(worker.OPERACOES_PATH, ns=(0, 0))
+    worker.atualizar_saida_uma_vez()
+    saida = json.loads(worker.SAIDA_PATH.read_text())["posicional"]
+    assert saida[0]["entrada"] == 200.0
+
+
+def _gravar_precos_duplos(worker, conteudo_cbor, mtime_cbor, mtime_json):
+    worker.OPERACOES_PATH.write_text(
+        json.dumps({"posicional": [{"id": 1, "par": "BTC", "side": "LONG", "entrada": 100.0}]})
+    )
+    path_cbor = worker.PRECOS_PATH.with_suffix(".cbor")
+    path_cbor.write_bytes(conteudo_cbor)
+    worker.PRECOS_PATH.write_text(json.dumps({"precos": {"BTC": 222.0}}))
+    os.utime(path_cbor, ns=(mtime_cbor, mtime_cbor))
+    os.utime(worker.PRECOS_PATH, ns=(mtime_json, mtime_json))
+
+
+def _preco_lido(worker):
+    worker.atualizar_saida_uma_vez()
+    return json.loads(worker.SAIDA_PATH.read_text())["posicional"][0]["preco"]
+
+
+@pytest.mark.parametrize(
+    "mtime_cbor, mtime_json, esperado",
+    [
+        (2_000_000_000, 1_000_000_000, 111.0),  # .cbor mais novo
+        (1_000_000_000, 1_000_000_000, 111.0),  # empate: .cbor
+        (1_000_000_000, 2_000_000_000, 222.0),  # .json sobrou mais novo
+    ],
+)
+def test_escolhe_precos_cbor_ou_json_pelo_mtime(worker, mtime_cbor, mtime_json, esperado):
+    cbor2 = pytest.importorskip("cbor2")
+    conteudo = cbor2.dumps({"precos": {"BTC": 111.0}})
+    _gravar_precos_duplos(worker, conteudo, mtime_cbor, mtime_json)
+
+    assert _preco_lido(worker) == esperado
+
+
+def test_sem_cbor2_le_o_json(worker, monkeypatch):
+    # .cbor mais novo, mas ilegível sem o pacote: deve ficar com o .json
+    _gravar_precos_duplos(worker, b"\xa1", 2_000_000_000, 1_000_000_000)
+    import saida_common
+    monkeypatch.setattr(saida_common, "cbor2", None)
+
+    assert _preco_lido(worker) == 222.0
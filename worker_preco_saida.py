@@ -3,22 +3,31 @@
 
 """
 worker_preco_saida.py
-Atualiza a cada 5 minutos um JSON com os preços médios das moedas,
-para o painel de Saída Posicional.
+Atualiza um JSON com os preços médios das moedas, para o painel de
+Saída Posicional. Cada execução faz UM ciclo e termina; o agendamento a
+cada 5 minutos fica com o systemd (systemd/saida-preco.timer).
 
 Saída:
-  /home/roteiro_ds/autotrader-saida-posicional/data/precos_saida.json
+  /home/roteiro_ds/autotrader-saida-posicional/data/precos_saida.cbor
+  (ou precos_saida.json, se o pacote cbor2 não estiver instalado)
 """
 
-import json
-import os
+import asyncio
 import time
 from datetime import datetime, timezone
-import ccxt
+from pathlib import Path
+import ccxt.async_support as ccxt
 
-OUT_PATH = "/home/roteiro_ds/autotrader-saida-posicional/data/precos_saida.json"
+from saida_common import escrever_direto, json_dumps, json_loads, salvar_precos
 
-MOEDAS = [
+OUT_PATH = Path("/home/roteiro_ds/autotrader-saida-posicional/data/precos_saida.json")
+
+# Mercados <MOEDA>/USDT de cada exchange, guardados em disco por 24h
+# (data/mercados_<exchange>.json) para não refazer o load_markets a cada ciclo.
+# O cache guarda também a lista de MOEDAS: se ela mudar, o cache é refeito.
+MERCADOS_TTL_SEGUNDOS = 24 * 60 * 60
+
+MOEDAS = (
     "AAVE", "ADA", "APE", "APT", "AR", "ARB", "ATOM", "AVAX", "AXS", "BAT",
     "BCH", "BLUR", "BNB", "BONK", "BTC", "COMP", "CRV", "DASH", "DGB", "DENT",
     "DOGE", "DOT", "EGLD", "EOS", "ETC", "ETH", "FET", "FIL", "FLOKI", "FLOW",
@@ -27,72 +36,150 @@ MOEDAS = [
     "ONT", "OP", "ORDI", "PEPE", "QNT", "QTUM", "RNDR", "ROSE", "RUNE", "SAND",
     "SEI", "SHIB", "SNX", "SOL", "STX", "SUSHI", "TIA", "THETA", "TRX", "UNI",
     "VET", "XEM", "XLM", "XRP", "XVS", "ZEC", "ZRX",
-]
+)
 
 def agora_iso() -> str:
   # horário UTC; o painel só precisa da hora, não do fuso exato
   return datetime.now(timezone.utc).isoformat()
 
 def criar_exchanges():
-  # sem chave: só preço público
+  # sem chave: só preço público (cliente assíncrono do ccxt)
   binance = ccxt.binance()
   bybit = ccxt.bybit()
   return binance, bybit
 
-def obter_preco_medio(binance, bybit, symbol_base: str) -> float | None:
+def caminho_cache_mercados(ex) -> Path:
+  return OUT_PATH.parent / f"mercados_{ex.id}.json"
+
+async def carregar_mercados(ex, moedas, recarregar: bool = False) -> bool:
   """
-  Tenta pegar o preço médio de BINANCE e BYBIT para <MOEDA>/USDT.
-  Se só existir em uma, usa a que tiver. Se nenhuma tiver, retorna None.
+  Carrega na exchange os mercados <MOEDA>/USDT a partir do cache em disco,
+  se tiver menos de 24h e for da mesma lista de MOEDAS. Senão (ou com
+  recarregar=True) busca tudo na exchange e regrava o cache só com os
+  mercados das moedas acompanhadas.
+
+  Devolve True se os mercados vieram do cache e ele ainda pode ser
+  recarregado por falha no fetch_tickers: no máximo uma recarga por cache,
+  para um símbolo recusado não derrubar o cache a cada ciclo.
   """
-  market = f"{symbol_base}/USDT"
-  precos = []
-
-  for ex in (binance, bybit):
+  cache = caminho_cache_mercados(ex)
+  lista_moedas = sorted(moedas)
+  if not recarregar:
     try:
-      ticker = ex.fetch_ticker(market)
-      last = ticker.get("last")
-      if last is not None:
-        precos.append(float(last))
-    except Exception:
-      # ignora erro dessa exchange pra essa moeda
-      continue
-
-  if not precos:
-    return None
-  return sum(precos) / len(precos)
-
-def loop():
+      if time.time() - cache.stat().st_mtime < MERCADOS_TTL_SEGUNDOS:
+        dados = json_loads(cache.read_bytes())
+        if dados.get("moedas") == lista_moedas:
+          ex.set_markets(dados["mercados"])
+          return not dados.get("recarregado", False)
+    except (OSError, ValueError, AttributeError, KeyError):
+      pass
+
+  mercados = await ex.load_markets(reload=recarregar)
+  desejados = {f"{m}/USDT" for m in moedas}
+  cache.parent.mkdir(parents=True, exist_ok=True)
+  # só este worker lê o cache, e nunca durante a gravação: não precisa de .tmp
+  escrever_direto(cache, json_dumps({
+    "moedas": lista_moedas,
+    "recarregado": recarregar,
+    "mercados": {s: mk for s, mk in mercados.items() if s in desejados},
+  }))
+  return False
+
+def simbolos_ativos(ex, moedas) -> list[str]:
+  """<MOEDA>/USDT listados e ativos na exchange (o ccxt mantém deslistados com active=False)."""
+  simbolos = []
+  for moeda in moedas:
+    symbol = f"{moeda}/USDT"
+    mercado = ex.markets.get(symbol)
+    if mercado is not None and mercado.get("active") is not False:
+      simbolos.append(symbol)
+  return simbolos
+
+async def buscar_tickers_um_a_um(ex, symbols) -> dict:
+  """fetch_ticker por símbolo, em paralelo: o erro de uma moeda não afeta as outras."""
+  resultados = await asyncio.gather(
+    *(ex.fetch_ticker(symbol) for symbol in symbols),
+    return_exceptions=True,
+  )
+  return {s: t for s, t in zip(symbols, resultados) if not isinstance(t, Exception)}
+
+async def buscar_precos_exchange(ex, moedas) -> dict[str, float]:
+  """
+  Busca numa ÚNICA chamada (fetch_tickers) o último preço de <MOEDA>/USDT de
+  todas as moedas ativas na exchange. Se o lote falhar (basta um símbolo
+  recusado), busca moeda a moeda. Devolve {moeda: preço}.
+  """
+  try:
+    pode_recarregar = await carregar_mercados(ex, moedas)
+  except Exception as e:
+    print(f"  ERRO {ex.id}: {e}")
+    return {}
+
+  symbols = simbolos_ativos(ex, moedas)
+  if not symbols:
+    return {}
+  try:
+    tickers = await ex.fetch_tickers(symbols)
+  except Exception as e:
+    tickers = None
+    print(f"  AVISO {ex.id}: fetch_tickers falhou ({e})")
+
+  if tickers is None and pode_recarregar:
+    # o cache pode ter mercado deslistado/renomeado: recarrega (uma vez) e tenta de novo
+    try:
+      await carregar_mercados(ex, moedas, recarregar=True)
+      symbols = simbolos_ativos(ex, moedas)
+      tickers = await ex.fetch_tickers(symbols) if symbols else {}
+    except Exception as e:
+      print(f"  AVISO {ex.id}: fetch_tickers falhou após recarregar mercados ({e})")
+
+  if tickers is None:
+    print(f"  AVISO {ex.id}: buscando moeda a moeda")
+    tickers = await buscar_tickers_um_a_um(ex, symbols)
+
+  precos = {}
+  for moeda in moedas:
+    ticker = tickers.get(f"{moeda}/USDT")
+    if ticker and ticker.get("last") is not None:
+      precos[moeda] = float(ticker["last"])
+  return precos
+
+async def atualizar_precos():
+  """Executa UM ciclo: busca os preços, grava o arquivo e fecha as exchanges."""
   binance, bybit = criar_exchanges()
 
-  while True:
+  try:
     print("[worker_preco_saida] Atualizando preços...")
     precos: dict[str, float] = {}
 
+    # uma chamada em lote por exchange, as duas em paralelo
+    por_exchange = await asyncio.gather(
+      buscar_precos_exchange(binance, MOEDAS),
+      buscar_precos_exchange(bybit, MOEDAS),
+    )
+
+    # preço médio de BINANCE e BYBIT; se só existir em uma, usa a que tiver
     for moeda in MOEDAS:
-      try:
-        preco = obter_preco_medio(binance, bybit, moeda)
-        if preco is not None:
-          precos[moeda] = round(preco, 6)
-          print(f"  {moeda}: {precos[moeda]}")
-        else:
-          print(f"  {moeda}: sem preço em BINANCE/BYBIT")
-      except Exception as e:
-        print(f"  ERRO {moeda}: {e}")
+      cotacoes = [p[moeda] for p in por_exchange if moeda in p]
+      if cotacoes:
+        precos[moeda] = round(sum(cotacoes) / len(cotacoes), 6)
+        print(f"  {moeda}: {precos[moeda]}")
+      else:
+        print(f"  {moeda}: sem preço em BINANCE/BYBIT")
 
     payload = {
       "ultima_atualizacao": agora_iso(),
       "precos": precos,
     }
 
-    os.makedirs(os.path.dirname(OUT_PATH), exist_ok=True)
-    with open(OUT_PATH, "w", encoding="utf-8") as f:
-      json.dump(payload, f, ensure_ascii=False, indent=2)
+    destino = salvar_precos(OUT_PATH, payload)
 
     print(
-      f"[worker_preco_saida] JSON salvo em {OUT_PATH} "
-      f"com {len(precos)} moedas. Aguardando 5 minutos..."
+      f"[worker_preco_saida] Preços salvos em {destino} "
+      f"com {len(precos)} moedas."
     )
-    time.sleep(5 * 60)
+  finally:
+    await asyncio.gather(binance.close(), bybit.close(), return_exceptions=True)
 
 if __name__ == "__main__":
-  loop()
+  asyncio.run(atualizar_precos())
@@ -9,37 +9,28 @@ Função:
 - Ler preços reais do painel de ENTRADA (entrada.json)
 - Atualizar PREÇO e GANHO das operações ABERTAS no painel de SAÍDA
 - Atualizar DATA e HORA da última atualização
-- Rodar em loop a cada 5 minutos
+- Executar um ciclo por chamada (agendado a cada 5 minutos, ex.: systemd timer)
 """
 
-import json
-import time
+import sys
 import datetime as dt
 from pathlib import Path
 
+import numpy as np
+
+from saida_calculo import calcular_lote
+from saida_common import carregar_json, salvar_json
+
 # Caminhos dos arquivos
 ENTRADA_PATH = Path("/home/roteiro_ds/autotrader-planilhas-python/data/entrada.json")
 SAIDA_PATH   = Path("/home/roteiro_ds/autotrader-saida-posicional/data/saida_posicional.json")
 
 
-def carregar_json(caminho, default):
+def para_float(valor) -> float:
     try:
-        with caminho.open("r", encoding="utf-8") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"[AVISO] Arquivo não encontrado: {caminho}")
-        return default
-    except json.JSONDecodeError:
-        print(f"[ERRO] JSON inválido em: {caminho}")
-        return default
-
-
-def salvar_json(caminho, dados):
-    caminho.parent.mkdir(parents=True, exist_ok=True)
-    tmp = caminho.with_suffix(".tmp")
-    with tmp.open("w", encoding="utf-8") as f:
-        json.dump(dados, f, ensure_ascii=False, indent=2)
-    tmp.replace(caminho)
+        return float(valor)
+    except (TypeError, ValueError):
+        return 0.0
 
 
 def normalizar_par(par: str) -> str:
@@ -53,58 +44,26 @@ def normalizar_par(par: str) -> str:
     """
     if not par:
         return ""
-    p = par.upper().strip()
-    p = p.replace("/", "").replace("-", "")
-    if p.endswith("USDT"):
-        p = p[:-4]
-    return p.strip()
+    p = par.upper().strip().replace("/", "").replace("-", "")
+    return p.removesuffix("USDT").strip()
 
 
-def obter_preco_posicional(entrada_data, par_saida):
+def montar_mapa_precos(entrada_data):
     """
-    Busca o preço atual do par (normalizado) na lista POSICIONAL do painel de entrada.
+    Monta {par normalizado: preço} a partir da lista POSICIONAL do painel de entrada.
+    Feito uma vez por ciclo, para cada operação buscar o preço em O(1).
+    Se o par aparecer repetido, vale o primeiro (preço inválido vira None).
     """
-    alvo = normalizar_par(par_saida)
-    if not alvo:
-        return None
-
+    mapa = {}
     for item in entrada_data.get("posicional", []):
         par_entrada = normalizar_par(item.get("par"))
-        if par_entrada == alvo:
-            try:
-                return float(item.get("preco", 0) or 0)
-            except (TypeError, ValueError):
-                return None
-    return None
-
-
-def calcular_ganho_real(side, entrada, preco_atual):
-    """
-    Calcula GANHO (ganho real) sempre POSITIVO em %.
-    - LONG  : ganho se preço subiu
-    - SHORT : ganho se preço caiu
-    """
-    try:
-        entrada = float(entrada)
-        preco_atual = float(preco_atual)
-    except (TypeError, ValueError):
-        return 0.0
-
-    if entrada <= 0 or preco_atual <= 0:
-        return 0.0
-
-    side = (side or "").upper()
-
-    if side == "LONG":
-        pct = (preco_atual / entrada - 1.0) * 100.0
-    else:  # SHORT ou qualquer outra coisa
-        pct = (entrada / preco_atual - 1.0) * 100.0
-
-    # Nunca mostrar negativo
-    if pct < 0:
-        pct = 0.0
-
-    return round(pct, 2)
+        if not par_entrada or par_entrada in mapa:
+            continue
+        try:
+            mapa[par_entrada] = float(item.get("preco", 0) or 0)
+        except (TypeError, ValueError):
+            mapa[par_entrada] = None
+    return mapa
 
 
 def atualizar_saida_uma_vez():
@@ -128,7 +87,9 @@ def atualizar_saida_uma_vez():
     total_ops = len(operacoes)
     abertas = 0
     sem_preco = 0
-    total_atualizadas = 0
+
+    preco_map = montar_mapa_precos(entrada_data)
+    atualizar = []
 
     for op in operacoes:
         situacao = (op.get("situacao") or op.get("status") or "").upper().strip()
@@ -137,31 +98,39 @@ def atualizar_saida_uma_vez():
 
         abertas += 1
 
-        par = op.get("par")
-        side = op.get("side") or op.get("tipo") or "NAO_ENTRAR"
-        entrada = op.get("entrada")
-
-        preco_atual = obter_preco_posicional(entrada_data, par)
+        preco_atual = preco_map.get(normalizar_par(op.get("par")))
         if preco_atual is None or preco_atual == 0:
             sem_preco += 1
             continue
 
+        atualizar.append((op, preco_atual))
+
+    # GANHO real calculado em lote (mesma regra do painel de saída)
+    ganhos, _, _ = calcular_lote(
+        np.array([para_float(op.get("entrada")) for op, _ in atualizar], dtype=float),
+        np.array([preco for _, preco in atualizar], dtype=float),
+        np.array(
+            [(op.get("side") or op.get("tipo") or "").upper().strip() for op, _ in atualizar],
+            dtype=str,
+        ),
+    )
+    for (op, preco_atual), ganho in zip(atualizar, ganhos.tolist()):
         # Atualiza PREÇO e GANHO reais
         op["preco"] = round(preco_atual, 3)
-        op["ganho"] = calcular_ganho_real(side, entrada, preco_atual)
+        op["ganho"] = round(max(ganho, 0.0), 2)  # nunca mostrar negativo
 
         # Atualiza data/hora
         op["data"] = data_str
         op["hora"] = hora_str
 
-        total_atualizadas += 1
+    total_atualizadas = len(atualizar)
 
-    # Salva mantendo o formato original
+    # Salva mantendo o formato original (indentado: as operações são editadas à mão)
     if wrapper is None:
-        salvar_json(SAIDA_PATH, operacoes)
+        salvar_json(SAIDA_PATH, operacoes, indentar=True)
     else:
         wrapper["operacoes"] = operacoes
-        salvar_json(SAIDA_PATH, wrapper)
+        salvar_json(SAIDA_PATH, wrapper, indentar=True)
 
     if total_atualizadas:
         print(
@@ -176,15 +145,14 @@ def atualizar_saida_uma_vez():
         )
 
 
-def loop_principal():
-    while True:
-        try:
-            atualizar_saida_uma_vez()
-        except Exception as e:
-            print("[ERRO] Falha ao atualizar Saída:", repr(e))
-        # Aguarda 5 minutos
-        time.sleep(300)
+def main():
+    try:
+        atualizar_saida_uma_vez()
+    except Exception as e:
+        print("[ERRO] Falha ao atualizar Saída:", repr(e))
+        return 1
+    return 0
 
 
 if __name__ == "__main__":
-    loop_principal()
+    sys.exit(main())